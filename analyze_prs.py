@@ -5,171 +5,225 @@
 # Sprint 3 - Laboratório de Experimentação de Software
 # ==============================================================
 
+import os
+
 import pandas as pd
+import polars as pl
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from scipy.stats import spearmanr
-
-# --------------------------------------------------------------
-# 1️⃣ Leitura do dataset
-# --------------------------------------------------------------
-print("📂 Lendo dataset 'filtered_prs.json'...")
 
-# Carrega o arquivo JSON e normaliza estrutura aninhada
-import json
-with open("filtered_prs.json", "r", encoding="utf-8") as f:
-    data = json.load(f)
-df = pd.json_normalize(data, record_path=["repository", "pullRequests"], meta=[["repository", "nameWithOwner"]])
+from build_dataset import INPUT_SCHEMA
 
-print(f"✅ Total de registros (PRs): {len(df)}")
+JSON_PATH = "filtered_prs.json"
+PARQUET_PATH = "filtered_prs.parquet"
+STATE_CATEGORIES = ["MERGED", "CLOSED"]
+PR_COLUMNS = [
+    "state", "createdAt", "closedAt", "mergedAt", "additions", "deletions",
+    "reviewCount", "commentsCount", "participantsCount", "descriptionSize",
+]
+# Colunas produzidas por load_dataset (usadas para validar o cache em Parquet)
+DATASET_COLUMNS = PR_COLUMNS + ["finalDate", "analysis_time_hours", "total_changes", "interactions"]
 
 # --------------------------------------------------------------
-# 2️⃣ Pré-processamento e criação de métricas auxiliares
-# --------------------------------------------------------------
-print("🧩 Processando métricas...")
-
-# Converte datas
-df["createdAt"] = pd.to_datetime(df["createdAt"], errors="coerce")
-df["closedAt"] = pd.to_datetime(df["closedAt"], errors="coerce")
-df["mergedAt"] = pd.to_datetime(df["mergedAt"], errors="coerce")
-
-# Calcula data final (merge ou close)
-df["finalDate"] = df["mergedAt"].fillna(df["closedAt"])
-
-# Tempo de análise em horas
-df["analysis_time_hours"] = (df["finalDate"] - df["createdAt"]).dt.total_seconds() / 3600
-
-# Tamanho total (adições + deleções)
-df["total_changes"] = df["additions"] + df["deletions"]
-
-# Interações totais (comentários + participantes)
-df["interactions"] = df["commentsCount"] + df["participantsCount"]
-
-# Filtra PRs válidos
-df = df.dropna(subset=["analysis_time_hours"])
-
-print("✅ Métricas calculadas com sucesso!")
-
-# --------------------------------------------------------------
-# 3️⃣ Cálculo das correlações (Spearman)
+# 1️⃣ Leitura do dataset
 # --------------------------------------------------------------
-print("\n📈 Calculando correlações (Spearman)...")
-
-def calc_corr(x, y):
-    corr, _ = spearmanr(df[x], df[y])
-    return round(corr, 3)
-
-correlacoes = {
-    "RQ01": calc_corr("total_changes", "state"),  # não numérico, apenas ilustrativo
-    "RQ02": calc_corr("analysis_time_hours", "reviewCount"),
-    "RQ03": calc_corr("descriptionSize", "reviewCount"),
-    "RQ04": calc_corr("interactions", "reviewCount"),
-    "RQ05": calc_corr("total_changes", "reviewCount"),
-    "RQ06": calc_corr("analysis_time_hours", "reviewCount"),
-    "RQ07": calc_corr("descriptionSize", "reviewCount"),
-    "RQ08": calc_corr("interactions", "reviewCount"),
-}
-
-print("✅ Correlações calculadas com sucesso!")
-print("\n📊 Resultados das correlações (Spearman):")
-for rq, corr in correlacoes.items():
-    print(f"{rq}: {corr}")
+def load_dataset(path):
+    print(f"📂 Lendo dataset '{path}'...")
+
+    # Carrega o arquivo JSON (esquema explícito: datas sempre nulas continuam String)
+    # e achata a estrutura aninhada (repositório → PRs)
+    df = (
+        pl.read_json(path, schema=INPUT_SCHEMA)
+        .unnest("repository")
+        .select("pullRequests")
+        .explode("pullRequests")
+        .unnest("pullRequests")
+        # Mantém apenas os campos usados na análise (descarta título, URL etc.)
+        .select(PR_COLUMNS)
+    )
+
+    print(f"✅ Total de registros (PRs): {df.height}")
+
+    # ----------------------------------------------------------
+    # 2️⃣ Pré-processamento e criação de métricas auxiliares
+    # ----------------------------------------------------------
+    print("🧩 Processando métricas...")
+
+    # Converte datas (valores inválidos viram nulos, como errors="coerce")
+    df = df.with_columns(
+        pl.col("createdAt").str.to_datetime(time_zone="UTC", strict=False),
+        pl.col("closedAt").str.to_datetime(time_zone="UTC", strict=False),
+        pl.col("mergedAt").str.to_datetime(time_zone="UTC", strict=False),
+    )
+
+    df = df.with_columns(
+        # Calcula data final (merge ou close)
+        pl.col("mergedAt").fill_null(pl.col("closedAt")).alias("finalDate"),
+        # Tempo de análise em horas (duração em microssegundos int64 → horas, numa única divisão)
+        ((pl.col("mergedAt").fill_null(pl.col("closedAt")) - pl.col("createdAt")).dt.total_microseconds() / 3_600_000_000)
+        .alias("analysis_time_hours"),
+        # Tamanho total (adições + deleções)
+        (pl.col("additions") + pl.col("deletions")).alias("total_changes"),
+        # Interações totais (comentários + participantes)
+        (pl.col("commentsCount") + pl.col("participantsCount")).alias("interactions"),
+    )
+
+    # Filtra PRs válidos
+    return df.drop_nulls(subset=["analysis_time_hours"])
+
+def is_cache_valid():
+    if not os.path.exists(PARQUET_PATH):
+        return False
+
+    # Invalida o cache se o JSON ou este script (lógica de load_dataset) mudaram depois dele
+    cache_mtime = os.path.getmtime(PARQUET_PATH)
+    if cache_mtime <= os.path.getmtime(__file__):
+        return False
+    if os.path.exists(JSON_PATH) and cache_mtime <= os.path.getmtime(JSON_PATH):
+        return False
+
+    # Confere se o esquema é o que load_dataset produz hoje
+    return list(pl.read_parquet_schema(PARQUET_PATH)) == DATASET_COLUMNS
 
 # --------------------------------------------------------------
-# 4️⃣ Geração dos gráficos (um para cada RQ)
+# Configuração dos gráficos
 # --------------------------------------------------------------
-print("\n🎨 Gerando gráficos...")
-
-sns.set(style="whitegrid")
-plt.rcParams["axes.titlesize"] = 13
-
-# --- RQ01: Tamanho x Status ---
-plt.figure(figsize=(8,5))
-sns.boxplot(x="state", y="total_changes", data=df)
-plt.title("RQ01 - Tamanho dos PRs vs Status Final")
-plt.xlabel("Status do PR")
-plt.ylabel("Linhas adicionadas + removidas")
-plt.tight_layout()
-plt.savefig("grafico_RQ01.png")
-plt.close()
-
-# --- RQ02: Tempo x Status ---
-plt.figure(figsize=(8,5))
-sns.boxplot(x="state", y="analysis_time_hours", data=df)
-plt.title("RQ02 - Tempo de Análise vs Status Final")
-plt.xlabel("Status do PR")
-plt.ylabel("Tempo de Análise (horas)")
-plt.tight_layout()
-plt.savefig("grafico_RQ02.png")
-plt.close()
-
-# --- RQ03: Descrição x Status ---
-plt.figure(figsize=(8,5))
-sns.boxplot(x="state", y="descriptionSize", data=df)
-plt.title("RQ03 - Descrição vs Status Final")
-plt.xlabel("Status do PR")
-plt.ylabel("Tamanho da Descrição (caracteres)")
-plt.tight_layout()
-plt.savefig("grafico_RQ03.png")
-plt.close()
-
-# --- RQ04: Interações x Status ---
-plt.figure(figsize=(8,5))
-sns.boxplot(x="state", y="interactions", data=df)
-plt.title("RQ04 - Interações vs Status Final")
-plt.xlabel("Status do PR")
-plt.ylabel("Total de Interações")
-plt.tight_layout()
-plt.savefig("grafico_RQ04.png")
-plt.close()
-
-# --- RQ05: Tamanho x Revisões ---
-plt.figure(figsize=(6,5))
-sns.scatterplot(x="total_changes", y="reviewCount", data=df)
-plt.title("RQ05 - Tamanho vs Revisões")
-plt.xlabel("Linhas adicionadas + removidas")
-plt.ylabel("Número de Revisões")
-plt.tight_layout()
-plt.savefig("grafico_RQ05.png")
-plt.close()
-
-# --- RQ06: Tempo x Revisões ---
-plt.figure(figsize=(6,5))
-sns.scatterplot(x="analysis_time_hours", y="reviewCount", data=df)
-plt.title("RQ06 - Tempo de Análise vs Revisões")
-plt.xlabel("Tempo de Análise (horas)")
-plt.ylabel("Número de Revisões")
-plt.tight_layout()
-plt.savefig("grafico_RQ06.png")
-plt.close()
-
-# --- RQ07: Descrição x Revisões ---
-plt.figure(figsize=(6,5))
-sns.scatterplot(x="descriptionSize", y="reviewCount", data=df)
-plt.title("RQ07 - Descrição vs Revisões")
-plt.xlabel("Tamanho da Descrição (caracteres)")
-plt.ylabel("Número de Revisões")
-plt.tight_layout()
-plt.savefig("grafico_RQ07.png")
-plt.close()
-
-# --- RQ08: Interações x Revisões ---
-plt.figure(figsize=(6,5))
-sns.scatterplot(x="interactions", y="reviewCount", data=df)
-plt.title("RQ08 - Interações vs Revisões")
-plt.xlabel("Total de Interações")
-plt.ylabel("Número de Revisões")
-plt.tight_layout()
-plt.savefig("grafico_RQ08.png")
-plt.close()
-
-print("✅ Gráficos salvos com sucesso (grafico_RQ01.png → grafico_RQ08.png)")
+# RQ01–RQ04: métricas vs status final, num único painel 2x2
+STATUS_GRID_FILE = "grafico_RQ01-04.png"
+STATUS_PLOTS = [
+    # --- RQ01: Tamanho x Status ---
+    {"y": "total_changes", "title": "RQ01 - Tamanho dos PRs vs Status Final", "ylabel": "Linhas adicionadas + removidas"},
+    # --- RQ02: Tempo x Status ---
+    {"y": "analysis_time_hours", "title": "RQ02 - Tempo de Análise vs Status Final", "ylabel": "Tempo de Análise (horas)"},
+    # --- RQ03: Descrição x Status ---
+    {"y": "descriptionSize", "title": "RQ03 - Descrição vs Status Final", "ylabel": "Tamanho da Descrição (caracteres)"},
+    # --- RQ04: Interações x Status ---
+    {"y": "interactions", "title": "RQ04 - Interações vs Status Final", "ylabel": "Total de Interações"},
+]
+
+# RQ05–RQ08: métricas vs número de revisões, um arquivo por RQ
+PLOTS = [
+    # --- RQ05: Tamanho x Revisões ---
+    {"file": "grafico_RQ05.png", "x": "total_changes", "y": "reviewCount",
+     "title": "RQ05 - Tamanho vs Revisões", "xlabel": "Linhas adicionadas + removidas", "ylabel": "Número de Revisões"},
+    # --- RQ06: Tempo x Revisões ---
+    {"file": "grafico_RQ06.png", "x": "analysis_time_hours", "y": "reviewCount",
+     "title": "RQ06 - Tempo de Análise vs Revisões", "xlabel": "Tempo de Análise (horas)", "ylabel": "Número de Revisões"},
+    # --- RQ07: Descrição x Revisões ---
+    {"file": "grafico_RQ07.png", "x": "descriptionSize", "y": "reviewCount",
+     "title": "RQ07 - Descrição vs Revisões", "xlabel": "Tamanho da Descrição (caracteres)", "ylabel": "Número de Revisões"},
+    # --- RQ08: Interações x Revisões ---
+    {"file": "grafico_RQ08.png", "x": "interactions", "y": "reviewCount",
+     "title": "RQ08 - Interações vs Revisões", "xlabel": "Total de Interações", "ylabel": "Número de Revisões"},
+]
+
+def set_plot_style():
+    sns.set(style="whitegrid")
+    plt.rcParams["axes.titlesize"] = 13
+
+def render_status_grid(data):
+    # Um único figure reaproveitando o mesmo DataFrame em todos os eixos
+    fig, axes = plt.subplots(2, 2, figsize=(16,10))
+    for ax, plot in zip(axes.flat, STATUS_PLOTS):
+        sns.boxplot(x="state", y=plot["y"], data=data, ax=ax)
+        ax.set_title(plot["title"])
+        ax.set_xlabel("Status do PR")
+        ax.set_ylabel(plot["ylabel"])
+    fig.tight_layout()
+    fig.savefig(STATUS_GRID_FILE)
+    plt.close(fig)
+
+def render_plot(plot, data):
+    plt.figure(figsize=(6,5))
+    # Hexbin agrega os pontos em células (custo O(células) em vez de O(PRs))
+    plt.hexbin(data[plot["x"]], data[plot["y"]], gridsize=60, bins="log", cmap="viridis")
+    plt.colorbar(label="Quantidade de PRs (escala log)")
+    plt.title(plot["title"])
+    plt.xlabel(plot["xlabel"])
+    plt.ylabel(plot["ylabel"])
+    plt.tight_layout()
+    plt.savefig(plot["file"])
+    plt.close()
 
 # --------------------------------------------------------------
-# 5️⃣ Estatísticas descritivas (tabelas resumo)
+# Execução principal
 # --------------------------------------------------------------
-print("\n📋 Estatísticas descritivas das principais métricas:\n")
-print(df[["total_changes", "analysis_time_hours", "descriptionSize", "interactions", "reviewCount"]].describe())
-
-print("\n🏁 Análise concluída! Os gráficos e resultados estão prontos para o relatório final.")
+def main():
+    # Reaproveita o Parquet já processado enquanto ele continuar válido
+    if is_cache_valid():
+        print(f"📂 Lendo dataset processado '{PARQUET_PATH}'...")
+        df = pl.read_parquet(PARQUET_PATH)
+        print(f"✅ Total de registros (PRs): {df.height}")
+    elif not os.path.exists(JSON_PATH):
+        print(f"❌ ERRO: Arquivo '{JSON_PATH}' não encontrado no diretório atual.")
+        return
+    else:
+        df = load_dataset(JSON_PATH)
+        df.write_parquet(PARQUET_PATH)
+        print(f"💾 Dataset processado salvo em '{PARQUET_PATH}'")
+
+    # Converte para pandas apenas ao final (seaborn trabalha com pandas)
+    df = df.to_pandas()
+
+    # Status como categoria de ordem fixa: boxplots e comparações usam códigos inteiros
+    df["state"] = df["state"].astype(pd.CategoricalDtype(categories=STATE_CATEGORIES, ordered=False))
+
+    print("✅ Métricas calculadas com sucesso!")
+
+    # --------------------------------------------------------------
+    # 3️⃣ Cálculo das correlações (Spearman)
+    # --------------------------------------------------------------
+    print("\n📈 Calculando correlações (Spearman)...")
+
+    # Spearman = Pearson sobre os postos: ranqueia cada coluna uma única vez
+    # e calcula toda a matriz de correlação de uma vez
+    # Status codificado: 1 = MERGED, 0 = CLOSED
+    df["state_code"] = (df["state"] == "MERGED").astype("int8")
+    ranks = df[["total_changes", "analysis_time_hours", "descriptionSize", "interactions", "reviewCount", "state_code"]].rank(method="average")
+    corr_matrix = ranks.corr(method="pearson")
+
+    def calc_corr(x, y):
+        return round(corr_matrix.loc[x, y], 3)
+
+    correlacoes = {
+        "RQ01": calc_corr("total_changes", "state_code"),  # status codificado, apenas ilustrativo
+        "RQ02": calc_corr("analysis_time_hours", "reviewCount"),
+        "RQ03": calc_corr("descriptionSize", "reviewCount"),
+        "RQ04": calc_corr("interactions", "reviewCount"),
+        "RQ05": calc_corr("total_changes", "reviewCount"),
+        "RQ06": calc_corr("analysis_time_hours", "reviewCount"),
+        "RQ07": calc_corr("descriptionSize", "reviewCount"),
+        "RQ08": calc_corr("interactions", "reviewCount"),
+    }
+
+    print("✅ Correlações calculadas com sucesso!")
+    print("\n📊 Resultados das correlações (Spearman):")
+    for rq, corr in correlacoes.items():
+        print(f"{rq}: {corr}")
+
+    # --------------------------------------------------------------
+    # 4️⃣ Geração dos gráficos
+    # --------------------------------------------------------------
+    print("\n🎨 Gerando gráficos...")
+
+    # Renderiza no próprio processo: iniciar workers (reimportando polars,
+    # pandas, matplotlib e seaborn) custa mais do que desenhar os gráficos
+    set_plot_style()
+    render_status_grid(df)
+    for plot in PLOTS:
+        render_plot(plot, df)
+
+    print(f"✅ Gráficos salvos com sucesso ({STATUS_GRID_FILE} e grafico_RQ05.png → grafico_RQ08.png)")
+
+    # --------------------------------------------------------------
+    # 5️⃣ Estatísticas descritivas (tabelas resumo)
+    # --------------------------------------------------------------
+    print("\n📋 Estatísticas descritivas das principais métricas:\n")
+    print(df[["total_changes", "analysis_time_hours", "descriptionSize", "interactions", "reviewCount"]].describe())
+
+    print("\n🏁 Análise concluída! Os gráficos e resultados estão prontos para o relatório final.")
+
+
+if __name__ == "__main__":
+    main()
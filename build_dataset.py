@@ -1,74 +1,95 @@
-import json
-from datetime import datetime, timedelta
+from datetime import timedelta
+import logging
 import os
+import orjson
+import polars as pl
+
+logger = logging.getLogger("dataset")
+
+# Esquema de repos_and_prs.json (mesmos campos gravados por get_repos.py)
+PR_SCHEMA = pl.Struct({
+    'title': pl.String,
+    'url': pl.String,
+    'state': pl.String,
+    'createdAt': pl.String,
+    'closedAt': pl.String,
+    'mergedAt': pl.String,
+    'reviewCount': pl.Int64,
+    'numberOfFiles': pl.Int64,
+    'additions': pl.Int64,
+    'deletions': pl.Int64,
+    'descriptionSize': pl.Int64,
+    'participantsCount': pl.Int64,
+    'commentsCount': pl.Int64,
+})
+INPUT_SCHEMA = {
+    'repository': pl.Struct({
+        'nameWithOwner': pl.String,
+        'stars': pl.Int64,
+        'url': pl.String,
+        'pullRequests': pl.List(PR_SCHEMA),
+    })
+}
 
 def filter_pull_requests(input_filename, output_filename):
-    print(f"🚀 Iniciando filtragem dos dados do arquivo: {input_filename}")
+    logger.info("🚀 Iniciando filtragem dos dados do arquivo: %s", input_filename)
 
     # Verifica se o arquivo existe
     if not os.path.exists(input_filename):
-        print(f"❌ ERRO: Arquivo '{input_filename}' não encontrado no diretório atual.")
+        logger.error("❌ ERRO: Arquivo '%s' não encontrado no diretório atual.", input_filename)
         return
 
-    # Carrega os dados JSON
-    with open(input_filename, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    print(f"📦 Total de repositórios carregados: {len(data)}")
-
-    filtered_data = []
-    repos_names = []
-
-    for repo in data:
-        repo_name_with_owner = repo['repository']['nameWithOwner']
-        prs = repo['repository'].get('pullRequests', [])
-        print(f"🔍 Analisando {repo_name_with_owner} ({len(prs)} PRs)")
+    # Carrega os dados JSON com esquema explícito (entradas vazias mantêm as colunas)
+    data = pl.read_json(input_filename, schema=INPUT_SCHEMA)
 
-        filtered_pull_requests = []
+    logger.info("📦 Total de repositórios carregados: %d", data.height)
 
-        for pr in prs:
-            created_at = datetime.fromisoformat(pr['createdAt'].replace("Z", "+00:00"))
-            closed_at = datetime.fromisoformat(pr['closedAt'].replace("Z", "+00:00")) if pr['closedAt'] else None
-            merged_at = datetime.fromisoformat(pr['mergedAt'].replace("Z", "+00:00")) if pr['mergedAt'] else None
+    # Converte as datas (vazias ou ausentes viram nulos)
+    pr = pl.element().struct
+    created_at = pr.field("createdAt").str.to_datetime(time_zone="UTC", strict=False)
+    closed_at = pr.field("closedAt").str.to_datetime(time_zone="UTC", strict=False)
+    merged_at = pr.field("mergedAt").str.to_datetime(time_zone="UTC", strict=False)
 
-            # Aceita PRs com revisão ou comentários
-            has_reviews = (pr['reviewCount'] > 0) or (pr['commentsCount'] > 0)
+    # Aceita PRs com revisão ou comentários
+    has_reviews = (pr.field("reviewCount") > 0) | (pr.field("commentsCount") > 0)
 
-            # Calcula o tempo de análise
-            time_diff = None
-            if merged_at:
-                time_diff = merged_at - created_at
-            elif closed_at:
-                time_diff = closed_at - created_at
+    # Calcula o tempo de análise (merge ou, na falta dele, close)
+    time_diff = merged_at.fill_null(closed_at) - created_at
 
-            # Aplica filtros
-            if has_reviews and time_diff and time_diff >= timedelta(minutes=10):
-                filtered_pull_requests.append(pr)
+    # Aplica filtros dentro da lista de PRs de cada repositório (PRs sem data final ficam de fora)
+    is_valid = (has_reviews & (time_diff >= timedelta(minutes=10))).fill_null(False)
+    repos = (
+        data.lazy()
+        .unnest("repository")
+        .with_columns(pl.col("pullRequests").fill_null(pl.lit([], dtype=pl.List(PR_SCHEMA))))
+        .with_columns(
+            pl.col("pullRequests").list.len().alias("totalPRs"),
+            pl.col("pullRequests").list.eval(pl.element().filter(is_valid)),
+        )
+        .collect()
+    )
 
-        print(f"   ✅ {len(filtered_pull_requests)} PRs válidos após filtragem")
+    for name, total, valid in repos.select("nameWithOwner", "totalPRs", pl.col("pullRequests").list.len()).iter_rows():
+        logger.debug("🔍 %s: %d/%d PRs válidos após filtragem", name, valid, total)
 
-        # Mantém repositórios com pelo menos 20 PRs válidos
-        if len(filtered_pull_requests) >= 20:
-            filtered_repo_data = {
-                'repository': {
-                    'nameWithOwner': repo_name_with_owner,
-                    'stars': repo['repository']['stars'],
-                    'url': repo['repository']['url'],
-                    'pullRequests': filtered_pull_requests
-                }
-            }
-            filtered_data.append(filtered_repo_data)
-            repos_names.append(repo_name_with_owner)
+    # Mantém repositórios com pelo menos 20 PRs válidos
+    repos = repos.filter(pl.col("pullRequests").list.len() >= 20)
+    filtered_data = repos.select(
+        pl.struct("nameWithOwner", "stars", "url", "pullRequests").alias("repository")
+    ).to_dicts()
+    repos_names = repos["nameWithOwner"].to_list()
 
     # Salva os arquivos resultantes
     if filtered_data:
-        with open(output_filename, 'w', encoding='utf-8') as f:
-            json.dump(filtered_data, f, indent=4)
-        with open('repos_names.json', 'w', encoding='utf-8') as f:
-            json.dump(repos_names, f, indent=4)
-        print(f"\n💾 {len(filtered_data)} repositórios válidos salvos em '{output_filename}'")
+        with open(output_filename, 'wb') as f:
+            f.write(orjson.dumps(filtered_data, option=orjson.OPT_INDENT_2))
+        with open('repos_names.json', 'wb') as f:
+            f.write(orjson.dumps(repos_names, option=orjson.OPT_INDENT_2))
+        logger.info("💾 %d repositórios válidos salvos em '%s'", len(filtered_data), output_filename)
     else:
-        print("\n⚠️ Nenhum repositório atendeu aos critérios definidos — verifique os filtros ou os dados de entrada.")
+        logger.warning("⚠️ Nenhum repositório atendeu aos critérios definidos — verifique os filtros ou os dados de entrada.")
 
 if __name__ == "__main__":
+    # INFO para as fases da filtragem; use DEBUG para ver o resultado de cada repositório
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     filter_pull_requests("repos_and_prs.json", "filtered_prs.json")
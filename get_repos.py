@@ -1,8 +1,14 @@
-import json
-import requests
+import asyncio
+import hashlib
+import logging
 import time
 import os
 
+import diskcache
+import httpx
+import orjson
+from aiolimiter import AsyncLimiter
+
 # ====================================================
 # Script: get_repos.py
 # Autor: Rafael Martins
@@ -16,12 +22,57 @@ START_INDEX = 11
 if not GITHUB_TOKEN:
     raise EnvironmentError("❌ Variável de ambiente GITHUB_TOKEN não encontrada. Defina antes de executar.")
 
+logger = logging.getLogger("gh")
+
 API_URL = "https://api.github.com/graphql"
+HEADERS = {"Authorization": f"Bearer {GITHUB_TOKEN}"}
+
+# 🚦 Limites de concorrência e de taxa (limites secundários da API do GitHub)
+MAX_CONCURRENT_REQUESTS = 8
+REQUESTS_PER_MINUTE = 60
+
+# 🔌 Conexões reaproveitadas (keep-alive) e novas tentativas em falhas transitórias
+MAX_CONNECTIONS = 20
+MAX_RETRIES = 5
+RETRY_BACKOFF = 1                         # segundos; dobra a cada tentativa
+RETRY_STATUS_CODES = {502, 503, 504}
+
+# 💾 Cache em disco das respostas GraphQL (chave = hash da consulta)
+CACHE = diskcache.Cache(".gh_cache")
+SEARCH_CACHE_TTL = 24 * 60 * 60    # ranking de estrelas muda com frequência
+PR_CACHE_TTL = 7 * 24 * 60 * 60    # PRs fechados/mergeados são históricos
+
+
+# ====================================================
+# Função: enviar uma consulta GraphQL respeitando os limites
+# (respostas sem erros ficam em cache por cache_ttl segundos;
+#  erros 502/503/504 são repetidos com backoff exponencial)
+# ====================================================
+async def post_query(client, query, limiter, timeout=None, cache_ttl=None):
+    key = hashlib.blake2b(query.encode()).hexdigest()
+    cached = CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    for attempt in range(MAX_RETRIES + 1):
+        async with limiter:
+            response = await client.post(API_URL, json={"query": query}, timeout=timeout)
+        if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+            break
+        await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    if response.status_code != 200:
+        raise httpx.HTTPStatusError(f"Erro na requisição: {response.status_code} - {response.text}", request=response.request, response=response)
+
+    data = orjson.loads(response.content)
+    if "errors" not in data:
+        CACHE.set(key, data, expire=cache_ttl)
+    return data
 
 # ====================================================
 # Função: buscar os 200 repositórios mais populares
 # ====================================================
-def get_top_200_repos():
+async def get_top_200_repos(client, limiter):
     query_template = """
     {
       search(query: "stars:>0 sort:stars-desc", type: REPOSITORY, first: 100, after: AFTER_CURSOR) {
@@ -42,7 +93,6 @@ def get_top_200_repos():
     }
     """
 
-    headers = {"Authorization": f"Bearer {GITHUB_TOKEN}"}
     repos = []
     cursor = None
     has_next_page = True
@@ -50,19 +100,14 @@ def get_top_200_repos():
     while has_next_page and len(repos) < 200:
         query = query_template.replace("AFTER_CURSOR", f'"{cursor}"' if cursor else "null")
 
-        response = requests.post(API_URL, json={"query": query}, headers=headers)
-        if response.status_code != 200:
-            raise Exception(f"Erro na requisição: {response.status_code} - {response.text}")
-
-        data = response.json()
+        data = await post_query(client, query, limiter, cache_ttl=SEARCH_CACHE_TTL)
         search_data = data["data"]["search"]
         repos.extend(search_data["edges"])
 
         has_next_page = search_data["pageInfo"]["hasNextPage"]
         cursor = search_data["pageInfo"]["endCursor"]
 
-        print(f"🔹 Repositórios coletados: {len(repos)}")
-        time.sleep(1)  # respeita o limite de taxa da API
+        logger.info("🔹 Repositórios coletados: %d", len(repos))
 
     return repos[:200]
 
@@ -70,16 +115,17 @@ def get_top_200_repos():
 # ====================================================
 # Função: coletar até 100 PRs (MERGED ou CLOSED) de cada repositório
 # ====================================================
-def get_pull_requests_for_repos(repos, max_repos=200, max_prs_per_repo=100, repo_timeout=90):
+async def get_pull_requests_for_repos(client, limiter, repos, max_repos=200, max_prs_per_repo=100, repo_timeout=90, batch_size=5):
     """
     Coleta PRs de repositórios com limite de tempo por repositório.
     - max_repos: máximo de repositórios a processar
     - max_prs_per_repo: máximo de PRs por repositório
     - repo_timeout: tempo máximo (segundos) para coletar PRs de um repositório
+    - batch_size: quantidade de repositórios consultados por requisição (via aliases GraphQL)
+    Os lotes são coletados concorrentemente (até MAX_CONCURRENT_REQUESTS requisições em andamento).
     """
-    query_template = """
-    {
-      repository(owner: "OWNER", name: "NAME") {
+    repo_query_template = """
+      ALIAS: repository(owner: "OWNER", name: "NAME") {
         pullRequests(states: [MERGED, CLOSED], first: 20, after: AFTER_CURSOR, orderBy: {field: CREATED_AT, direction: DESC}) {
           edges {
             node {
@@ -104,70 +150,160 @@ def get_pull_requests_for_repos(repos, max_repos=200, max_prs_per_repo=100, repo
           }
         }
       }
-    }
     """
 
-    headers = {"Authorization": f"Bearer {GITHUB_TOKEN}"}
     repo_pr_map = {}
+    selected = list(enumerate(repos[START_INDEX-1:max_repos], start=START_INDEX))
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def fetch_batch(batch):
+        # Cada lote faz uma requisição por vez; o semáforo limita os lotes ativos
+        async with semaphore:
+            await fetch_batch_pages(batch)
+        return batch
+
+    async def fetch_page(pending):
+        # Uma única consulta com um alias por repositório pendente; None em caso de falha
+        query = "{" + "".join(
+            repo_query_template.replace("ALIAS", alias).replace("OWNER", state['owner']).replace("NAME", state['name']).replace("AFTER_CURSOR", f'"{state["cursor"]}"' if state['cursor'] else "null")
+            for alias, state in pending.items()
+        ) + "}"
+        batch_names = ", ".join(state['nameWithOwner'] for state in pending.values())
+
+        try:
+            data = await post_query(client, query, limiter, timeout=20, cache_ttl=PR_CACHE_TTL)
+        except httpx.TimeoutException:
+            logger.warning("⚠️ Timeout na requisição do GitHub para %s, pulando...", batch_names)
+            return None
+        except httpx.HTTPStatusError as e:
+            logger.warning("⚠️ Erro %d em %s, pulando...", e.response.status_code, batch_names)
+            return None
+        except Exception as e:
+            logger.warning("⚠️ Erro inesperado em %s: %s", batch_names, e)
+            return None
+
+        if not data.get("data"):
+            logger.warning("⚠️ Erros detectados em %s: %s", batch_names, data.get('errors'))
+            return None
+
+        return data
+
+    async def fetch_batch_pages(batch):
+        # Estado de paginação de cada repositório do lote, indexado pelo alias
+        pending = {}
+        for index, repo in batch:
+            repo_name_with_owner = repo['node']['nameWithOwner']
+            owner, name = repo_name_with_owner.split('/')
+            repo_pr_map[repo_name_with_owner] = []
+            pending[f"r{index}"] = {
+                'nameWithOwner': repo_name_with_owner,
+                'owner': owner,
+                'name': name,
+                'cursor': None,
+                'start_time': time.time(),
+            }
+            logger.info("🚀 Coletando PRs de %s (%d/%d)", repo_name_with_owner, index, min(len(repos), max_repos))
+
+        # A paginação continua sequencial dentro do lote; os lotes rodam em paralelo
+        while pending:
+            # ⏱️ Remove do lote os repositórios que atingiram o tempo limite
+            for alias, state in list(pending.items()):
+                if time.time() - state['start_time'] > repo_timeout:
+                    logger.warning("⏰ Tempo limite de %ss atingido para %s. Pulando repositório.", repo_timeout, state['nameWithOwner'])
+                    del pending[alias]
+            if not pending:
+                break
 
-    for index, repo in enumerate(repos[START_INDEX-1:], start=START_INDEX):
-        repo_name_with_owner = repo['node']['nameWithOwner']
-        owner, name = repo_name_with_owner.split('/')
-        cursor = None
-        has_next_page = True
-        repo_pr_map[repo_name_with_owner] = []
-        start_time = time.time()
-
-        print(f"\n🚀 Coletando PRs de {repo_name_with_owner} ({index}/{min(len(repos), max_repos)})")
-
-        while has_next_page and len(repo_pr_map[repo_name_with_owner]) < max_prs_per_repo:
-            # ⏱️ Verifica se o tempo limite foi atingido
-            if time.time() - start_time > repo_timeout:
-                print(f"⏰ Tempo limite de {repo_timeout}s atingido para {repo_name_with_owner}. Pulando repositório.")
+            data = await fetch_page(pending)
+
+            # Se a consulta em lote falhar, refaz a página repositório a repositório:
+            # uma falha individual descarta só aquele repositório, como na coleta sem lotes
+            if data is None and len(pending) > 1:
+                logger.warning("↩️ Consultando individualmente: %s", ", ".join(state['nameWithOwner'] for state in pending.values()))
+                data = {"data": {}, "errors": []}
+                for alias in list(pending):
+                    single = await fetch_page({alias: pending[alias]})
+                    if single is None:
+                        del pending[alias]
+                        continue
+                    data["data"].update(single["data"])
+                    data["errors"].extend(single.get("errors", []))
+            elif data is None:
                 break
 
-            query = query_template.replace("OWNER", owner).replace("NAME", name).replace("AFTER_CURSOR", f'"{cursor}"' if cursor else "null")
+            # Erros parciais afetam apenas os aliases indicados em "path"
+            for error in data.get("errors", []):
+                alias = (error.get("path") or [None])[0]
+                if alias in pending:
+                    logger.warning("⚠️ Erros detectados em %s: %s", pending[alias]['nameWithOwner'], error)
+                    del pending[alias]
 
-            try:
-                response = requests.post(API_URL, json={"query": query}, headers=headers, timeout=20)
-            except requests.exceptions.Timeout:
-                print(f"⚠️ Timeout na requisição do GitHub para {repo_name_with_owner}, pulando...")
-                break
-            except Exception as e:
-                print(f"⚠️ Erro inesperado em {repo_name_with_owner}: {e}")
-                break
+            for alias, state in list(pending.items()):
+                repo_name_with_owner = state['nameWithOwner']
+                repo_data = data["data"].get(alias)
+                if not repo_data:
+                    del pending[alias]
+                    continue
 
-            if response.status_code != 200:
-                print(f"⚠️ Erro {response.status_code} em {repo_name_with_owner}, pulando...")
-                break
+                pr_data = repo_data["pullRequests"]
+                repo_pr_map[repo_name_with_owner].extend(pr_data["edges"])
+                state['cursor'] = pr_data["pageInfo"]["endCursor"]
 
-            data = response.json()
-            if "errors" in data:
-                print(f"⚠️ Erros detectados em {repo_name_with_owner}: {data['errors']}")
-                break
+                logger.debug("   → %s: %d PRs coletados...", repo_name_with_owner, len(repo_pr_map[repo_name_with_owner]))
+
+                # Avança apenas os repositórios que ainda têm páginas e não atingiram o limite
+                if not pr_data["pageInfo"]["hasNextPage"] or len(repo_pr_map[repo_name_with_owner]) >= max_prs_per_repo:
+                    del pending[alias]
 
-            pr_data = data["data"]["repository"]["pullRequests"]
-            repo_pr_map[repo_name_with_owner].extend(pr_data["edges"])
+        for index, repo in batch:
+            repo_name_with_owner = repo['node']['nameWithOwner']
 
-            has_next_page = pr_data["pageInfo"]["hasNextPage"]
-            cursor = pr_data["pageInfo"]["endCursor"]
+            # Garante que o número máximo de PRs não seja excedido
+            repo_pr_map[repo_name_with_owner] = repo_pr_map[repo_name_with_owner][:max_prs_per_repo]
 
-            print(f"   → {len(repo_pr_map[repo_name_with_owner])} PRs coletados...")
-            time.sleep(1)
+    batches = [selected[start:start + batch_size] for start in range(0, len(selected), batch_size)]
+    completed = []
 
-        # Garante que o número máximo de PRs não seja excedido
-        repo_pr_map[repo_name_with_owner] = repo_pr_map[repo_name_with_owner][:max_prs_per_repo]
+    for finished in asyncio.as_completed([fetch_batch(batch) for batch in batches]):
+        batch = await finished
+        previous_count = len(completed)
+        completed.extend(repo['node']['nameWithOwner'] for _, repo in batch)
 
-        # 🔸 Salva progresso parcial a cada 10 repositórios
-        if index % 10 == 0:
-            partial_filename = f"repos_and_prs_partial_{index}.json"
-            save_repos_and_prs_to_json(repos[:index], repo_pr_map, partial_filename)
-            print(f"💾 Progresso salvo em {partial_filename}")
+        # 🔸 Salva progresso parcial a cada 10 repositórios concluídos
+        if len(completed) // 10 > previous_count // 10:
+            partial_filename = f"repos_and_prs_partial_{len(completed)}.json"
+            completed_repos = [repo for repo in repos if repo['node']['nameWithOwner'] in completed]
+            save_repos_and_prs_to_json(completed_repos, repo_pr_map, partial_filename)
+            logger.info("💾 Progresso salvo em %s", partial_filename)
 
     return repo_pr_map
 
 
 
+# ====================================================
+# Função: extrair os campos de interesse de um PR
+# ====================================================
+def build_pr_data(pr_node):
+    get = pr_node.get
+
+    # ⚙️ Correção: usa ou {} caso o campo seja None
+    return {
+        'title': get('title', ''),
+        'url': get('url', ''),
+        'state': get('state', ''),
+        'createdAt': get('createdAt', ''),
+        'closedAt': get('closedAt', ''),
+        'mergedAt': get('mergedAt', ''),
+        'reviewCount': (get('reviews') or {}).get('totalCount', 0),
+        'numberOfFiles': (get('files') or {}).get('totalCount', 0),
+        'additions': get('additions', 0),
+        'deletions': get('deletions', 0),
+        'descriptionSize': len(get('body') or ''),
+        'participantsCount': (get('participants') or {}).get('totalCount', 0),
+        'commentsCount': (get('comments') or {}).get('totalCount', 0)
+    }
+
+
 # ====================================================
 # Função: salvar dados combinados em JSON
 # ====================================================
@@ -183,63 +319,55 @@ def save_repos_and_prs_to_json(repos, repo_pr_map, json_filename):
         if not pull_requests:
             continue
 
-        repo_data = {
+        data.append({
             'repository': {
                 'nameWithOwner': repo_name_with_owner,
                 'stars': repo_stars,
                 'url': repo_url,
-                'pullRequests': []
+                'pullRequests': [build_pr_data(pr.get('node') or {}) for pr in pull_requests]
             }
-        }
-
-        for pr in pull_requests:
-          pr_node = pr.get('node', {})
-
-          # ⚙️ Correção: usa ou {} caso o campo seja None
-          files_info = pr_node.get('files') or {}
-          participants_info = pr_node.get('participants') or {}
-          comments_info = pr_node.get('comments') or {}
-          reviews_info = pr_node.get('reviews') or {}
-
-          pr_data = {
-              'title': pr_node.get('title', ''),
-              'url': pr_node.get('url', ''),
-              'state': pr_node.get('state', ''),
-              'createdAt': pr_node.get('createdAt', ''),
-              'closedAt': pr_node.get('closedAt', ''),
-              'mergedAt': pr_node.get('mergedAt', ''),
-              'reviewCount': reviews_info.get('totalCount', 0),
-              'numberOfFiles': files_info.get('totalCount', 0),
-              'additions': pr_node.get('additions', 0),
-              'deletions': pr_node.get('deletions', 0),
-              'descriptionSize': len(pr_node.get('body', '') or ''),
-              'participantsCount': participants_info.get('totalCount', 0),
-              'commentsCount': comments_info.get('totalCount', 0)
-          }
+        })
 
-          repo_data['repository']['pullRequests'].append(pr_data)
+    # JSON compacto (sem indentação): arquivo bem menor e escrita mais rápida
+    with open(json_filename, 'wb') as f:
+        f.write(orjson.dumps(data))
 
-
-        data.append(repo_data)
-
-    with open(json_filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
-
-    print(f"\n💾 Dados salvos em {json_filename}")
+    logger.info("💾 Dados salvos em %s", json_filename)
 
 
 # ====================================================
 # Execução principal
 # ====================================================
-if __name__ == "__main__":
-    print("🚀 Iniciando coleta de repositórios e PRs...")
+async def main():
+    logger.info("🚀 Iniciando coleta de repositórios e PRs...")
+
+    limiter = AsyncLimiter(REQUESTS_PER_MINUTE, 60)
 
-    repos = get_top_200_repos()
-    print(f"\n✅ Total de repositórios coletados: {len(repos)}")
+    # Um único cliente: pool de conexões HTTP/TLS reaproveitadas e cabeçalhos fixos
+    client = httpx.AsyncClient(
+        headers=HEADERS,
+        transport=httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+            retries=MAX_RETRIES,  # novas tentativas em falhas de conexão
+        ),
+    )
 
-    repo_pr_map = get_pull_requests_for_repos(repos)
-    print(f"\n✅ Coleta de PRs concluída para {len(repo_pr_map)} repositórios.")
+    async with client:
+        repos = await get_top_200_repos(client, limiter)
+        logger.info("✅ Total de repositórios coletados: %d", len(repos))
+
+        repo_pr_map = await get_pull_requests_for_repos(client, limiter, repos)
+        logger.info("✅ Coleta de PRs concluída para %d repositórios.", len(repo_pr_map))
 
     save_repos_and_prs_to_json(repos, repo_pr_map, "repos_and_prs.json")
 
-    print("\n🏁 Processo finalizado com sucesso!")
+    logger.info("🏁 Processo finalizado com sucesso!")
+
+
+if __name__ == "__main__":
+    # INFO para as fases da coleta; use DEBUG para ver o progresso de cada página
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # O httpx registra cada requisição em INFO; mantém apenas avisos e erros
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("httpcore").setLevel(logging.WARNING)
+    asyncio.run(main())